@@ -58,6 +58,12 @@ class Config:
         logger.info(f"  PORT: {cls.PORT}")
 
 
+# Settings used on the request path, bound once so callers can import them directly
+API_KEY: str = Config.API_KEY
+INFLUXDB_BUCKET: str = Config.INFLUXDB_BUCKET
+INFLUXDB_ORG: str = Config.INFLUXDB_ORG
+
+
 def setup_logging() -> None:
     """Configure application logging."""
     logging.basicConfig(
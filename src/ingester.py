@@ -4,19 +4,69 @@ Processes metrics and workouts from Health Auto Export app
 and writes them to InfluxDB.
 """
 
+import asyncio
+import itertools
 import logging
-from datetime import datetime
-from typing import Any
+import math
+import sys
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Callable, Iterable, Iterator
 
 from dateutil import parser as date_parser
-from influxdb_client import Point, WritePrecision
+from influxdb_client import WritePrecision
 from influxdb_client.client.write_api import WriteApi
 
-from .config import Config
+from .config import INFLUXDB_BUCKET, INFLUXDB_ORG
 from .models import METRIC_MAPPING, UNIT_MAPPING, SLEEP_FIELDS, HEART_RATE_FIELDS
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of points sent to InfluxDB in a single write request
+BATCH_SIZE = 5000
+
+# Maximum number of write requests in flight at once
+MAX_CONCURRENT_WRITES = 4
+
+_UTC = timezone.utc
+
+# Timestamp formats emitted by Health Auto Export, tried before falling back
+# to the (much slower) generic dateutil parser
+_KNOWN_FORMATS: tuple[str, ...] = (
+    "%Y-%m-%d %H:%M:%S %z",
+    "%Y-%m-%dT%H:%M:%S%z",
+    "%Y-%m-%dT%H:%M:%S.%f%z",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d",
+)
+
+# Line protocol escaping rules (see influxdb_client.client.write.point)
+_ESCAPE_MEASUREMENT = str.maketrans({
+    ",": r"\,",
+    " ": r"\ ",
+    "\n": r"\n",
+    "\t": r"\t",
+    "\r": r"\r",
+})
+_ESCAPE_TAG = str.maketrans({
+    ",": r"\,",
+    "=": r"\=",
+    " ": r"\ ",
+    "\n": r"\n",
+    "\t": r"\t",
+    "\r": r"\r",
+})
+
+# Single-pass replacement used by sanitize_metric_name
+_SANITIZE_TABLE = str.maketrans({" ": "_", "-": "_"})
+
+# Field mappings never change at runtime, so iterate over prebuilt tuples
+_HEART_RATE_ITEMS: tuple[tuple[str, str], ...] = tuple(HEART_RATE_FIELDS.items())
+_SLEEP_ITEMS: tuple[tuple[str, str], ...] = tuple(SLEEP_FIELDS.items())
+
+# Entry keys that carry a value at all
+_VALUE_FIELDS: frozenset[str] = frozenset(HEART_RATE_FIELDS) | frozenset(SLEEP_FIELDS) | {"qty"}
+
 
 def convert_units(value: float, from_unit: str, to_unit: str) -> float:
     """Convert between units.
@@ -36,6 +86,33 @@ def convert_units(value: float, from_unit: str, to_unit: str) -> float:
     return value
 
 
+@lru_cache(maxsize=4096)
+def _parse_date_cached(date_str: str) -> datetime:
+    """Parse a date string, trying known formats before dateutil.
+
+    Many metrics share the same sample timestamps, so results are memoized
+    already normalized to UTC. Failures raise and are therefore never cached.
+
+    Args:
+        date_str: Date string in various formats.
+
+    Returns:
+        Parsed datetime object in UTC (naive values are assumed to be UTC).
+    """
+    for fmt in _KNOWN_FORMATS:
+        try:
+            parsed = datetime.strptime(date_str, fmt)
+            break
+        except ValueError:
+            continue
+    else:
+        parsed = date_parser.parse(date_str)
+
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=_UTC)
+    return parsed.astimezone(_UTC)
+
+
 def parse_date(date_str: str) -> datetime:
     """Parse various date formats from Health Auto Export.
 
@@ -43,13 +120,13 @@ def parse_date(date_str: str) -> datetime:
         date_str: Date string in various formats.
 
     Returns:
-        Parsed datetime object, or current UTC time if parsing fails.
+        Parsed datetime object in UTC, or current UTC time if parsing fails.
     """
     try:
-        return date_parser.parse(date_str)
+        return _parse_date_cached(date_str)
     except Exception:
         logger.warning(f"Failed to parse date '{date_str}', using current time")
-        return datetime.utcnow()
+        return datetime.now(_UTC)
 
 
 def sanitize_metric_name(name: str) -> str:
@@ -61,9 +138,10 @@ def sanitize_metric_name(name: str) -> str:
     Returns:
         Sanitized name in snake_case.
     """
-    return name.lower().replace(" ", "_").replace("-", "_")
+    return name.lower().translate(_SANITIZE_TABLE)
 
 
+@lru_cache(maxsize=512)
 def get_entity_id(metric_name: str) -> str:
     """Get the entity_id for a metric.
 
@@ -74,7 +152,10 @@ def get_entity_id(metric_name: str) -> str:
         Mapped entity_id or generated fallback.
     """
     sanitized = sanitize_metric_name(metric_name)
-    return METRIC_MAPPING.get(sanitized, f"applehealth_{sanitized}")
+    entity_id = METRIC_MAPPING.get(sanitized)
+    if entity_id is not None:
+        return entity_id
+    return f"applehealth_{sanitized}"
 
 
 def get_unit_string(units: str) -> str:
@@ -89,167 +170,328 @@ def get_unit_string(units: str) -> str:
     return UNIT_MAPPING.get(units, units)
 
 
-def process_metrics(metrics: list[dict[str, Any]]) -> list[Point]:
-    """Process health metrics into InfluxDB points.
+def _escape_tag(value: str) -> str:
+    """Escape a tag value for line protocol."""
+    escaped = value.translate(_ESCAPE_TAG)
+    if escaped.endswith("\\"):
+        escaped += " "
+    return escaped
+
+
+@lru_cache(maxsize=256)
+def series_key(entity_id: str, unit: str) -> str:
+    """Build the line protocol measurement and tag set for an entity.
+
+    The set of series is small, so keys are cached and interned and every
+    line of a series shares the same prefix string.
+
+    Args:
+        entity_id: Entity ID of the series.
+        unit: Unit of measurement, stored as the "unit" tag (omitted if empty).
+
+    Returns:
+        Escaped "hae.<entity_id>,domain=hae,entity_id=<entity_id>,unit=<unit>" prefix.
+    """
+    measurement = f"hae.{entity_id}".translate(_ESCAPE_MEASUREMENT)
+    key = f"{measurement},domain=hae,entity_id={_escape_tag(entity_id)}"
+    if unit:
+        key += f",unit={_escape_tag(unit)}"
+    return sys.intern(key)
+
+
+def format_float(value: float) -> str:
+    """Format a float field value for line protocol.
+
+    Callers must skip non-finite values; like influxdb-client's Point,
+    NaN and infinity are never written.
+
+    Args:
+        value: The numeric value (must be finite).
+
+    Returns:
+        String representation without a redundant trailing ".0".
+    """
+    s = repr(value)
+    return s[:-2] if s.endswith(".0") else s
+
+
+def to_epoch_seconds(timestamp: datetime) -> int:
+    """Convert a timezone-aware datetime (as returned by parse_date) to Unix seconds.
+
+    Args:
+        timestamp: Timezone-aware datetime to convert.
+
+    Returns:
+        Seconds since the Unix epoch.
+    """
+    return int(timestamp.timestamp())
+
+
+# Sleep series are independent of the metric name: (field, series key)
+_SLEEP_SERIES: tuple[tuple[str, str], ...] = tuple(
+    (field, series_key(f"applehealth_sleep_analysis_{suffix}", "min"))
+    for field, suffix in _SLEEP_ITEMS
+)
+
+
+def _hr_series(entity_id: str) -> list[tuple[str, str]]:
+    """Build (entry key, series key) pairs for heart rate aggregates."""
+    return [
+        (key, series_key(f"{entity_id}_{suffix}", "bpm"))
+        for key, suffix in _HEART_RATE_ITEMS
+    ]
+
+
+def _process_qty_entries(
+    lines: list[str], data: list[dict[str, Any]], entity_id: str, unit: str, is_kcal: bool
+) -> None:
+    """Append lines for a plain quantity metric, converting values column-wise."""
+    series = series_key(entity_id, unit)
+    qty_entries = [entry for entry in data if "qty" in entry and entry.get("date")]
+    values = [float(entry["qty"]) for entry in qty_entries]
+    if is_kcal:
+        values = [convert_units(value, "kcal", "kJ") for value in values]
+    lines.extend(
+        f"{series} value={format_float(value)} {to_epoch_seconds(parse_date(entry['date']))}"
+        for value, entry in zip(values, qty_entries)
+        if math.isfinite(value)
+    )
+
+
+def _process_heart_rate_entries(
+    lines: list[str], data: list[dict[str, Any]], entity_id: str, unit: str, is_kcal: bool
+) -> None:
+    """Append lines for a heart rate metric with Min/Avg/Max per entry."""
+    hr_series = _hr_series(entity_id)
+    for entry in data:
+        date_str = entry.get("date")
+        if not date_str:
+            continue
+        ts = to_epoch_seconds(parse_date(date_str))
+        for key, hr_key in hr_series:
+            if key in entry:
+                value = float(entry[key])
+                if math.isfinite(value):
+                    lines.append(f"{hr_key} value={format_float(value)} {ts}")
+
+
+def _process_sleep_entries(
+    lines: list[str], data: list[dict[str, Any]], entity_id: str, unit: str, is_kcal: bool
+) -> None:
+    """Append lines for sleep analysis, one series per sleep type."""
+    for entry in data:
+        date_str = entry.get("date")
+        if not date_str:
+            continue
+        ts = to_epoch_seconds(parse_date(date_str))
+        for field, sleep_key in _SLEEP_SERIES:
+            if field in entry:
+                value = float(entry[field])
+                if math.isfinite(value):
+                    lines.append(f"{sleep_key} value={format_float(value)} {ts}")
+
+
+def _process_mixed_entries(
+    lines: list[str], data: list[dict[str, Any]], entity_id: str, unit: str, is_kcal: bool
+) -> None:
+    """Append lines for a metric of unknown shape, checking every field type."""
+    series = series_key(entity_id, unit)
+    hr_series = _hr_series(entity_id)
+
+    for entry in data:
+        date_str = entry.get("date")
+        if not date_str or entry.keys().isdisjoint(_VALUE_FIELDS):
+            continue
+        ts = to_epoch_seconds(parse_date(date_str))
+
+        # Standard qty field
+        if "qty" in entry:
+            value = float(entry["qty"])
+
+            # Convert units if needed
+            if is_kcal:
+                value = convert_units(value, "kcal", "kJ")
+
+            if math.isfinite(value):
+                lines.append(f"{series} value={format_float(value)} {ts}")
+
+        # Heart Rate with Min/Avg/Max
+        for key, hr_key in hr_series:
+            if key in entry:
+                value = float(entry[key])
+                if math.isfinite(value):
+                    lines.append(f"{hr_key} value={format_float(value)} {ts}")
+
+        # Sleep Analysis - separate measurements for each sleep type
+        for field, sleep_key in _SLEEP_SERIES:
+            if field in entry:
+                value = float(entry[field])
+                if math.isfinite(value):
+                    lines.append(f"{sleep_key} value={format_float(value)} {ts}")
+
+
+# (lines, data, entity_id, unit, is_kcal) -> None
+_EntryProcessor = Callable[[list[str], list[dict[str, Any]], str, str, bool], None]
+
+# Metrics with a known schema: entity_id -> (processor, value fields it handles)
+_PROCESSORS: dict[str, tuple[_EntryProcessor, frozenset[str]]] = {
+    "applehealth_heart_rate": (_process_heart_rate_entries, frozenset(HEART_RATE_FIELDS)),
+    "applehealth_sleep_analysis": (_process_sleep_entries, frozenset(SLEEP_FIELDS)),
+}
+
+# Default for all other metrics: plain quantities
+_QTY_PROCESSOR: tuple[_EntryProcessor, frozenset[str]] = (_process_qty_entries, frozenset({"qty"}))
+
+
+def process_metrics(metrics: list[dict[str, Any]]) -> list[str]:
+    """Process health metrics into InfluxDB line protocol.
+
+    The processor is picked once per metric: heart rate and sleep metrics
+    use their own and other metrics are converted column-wise as plain
+    quantities, as long as the chosen processor handles every value field
+    found in the entries. Anything else falls back to checking every field
+    type per entry.
 
     Args:
         metrics: List of metric dictionaries from Health Auto Export.
 
     Returns:
-        List of InfluxDB Point objects.
+        List of line protocol strings.
     """
-    points: list[Point] = []
+    lines: list[str] = []
 
     for metric in metrics:
         raw_name = metric.get("name", "unknown")
         entity_id = get_entity_id(raw_name)
-        measurement = f"hae.{entity_id}"
         units = metric.get("units", "")
-        unit_str = get_unit_string(units)
-
-        for entry in metric.get("data", []):
-            timestamp = parse_date(entry.get("date", ""))
-
-            # Standard qty field
-            if "qty" in entry:
-                value = float(entry["qty"])
-
-                # Convert units if needed
-                if units == "kcal":
-                    value = convert_units(value, "kcal", "kJ")
-                    unit_str = "kJ"
-
-                point = (
-                    Point(measurement)
-                    .tag("domain", "hae")
-                    .tag("entity_id", entity_id)
-                    .field("value", value)
-                    .field("unit_of_measurement_str", unit_str)
-                    .time(timestamp, WritePrecision.S)
-                )
-                points.append(point)
-
-            # Heart Rate with Min/Avg/Max
-            for key, suffix in HEART_RATE_FIELDS.items():
-                if key in entry:
-                    hr_entity_id = f"{entity_id}_{suffix}"
-                    hr_measurement = f"hae.{hr_entity_id}"
-                    point = (
-                        Point(hr_measurement)
-                        .tag("domain", "hae")
-                        .tag("entity_id", hr_entity_id)
-                        .field("value", float(entry[key]))
-                        .field("unit_of_measurement_str", "bpm")
-                        .time(timestamp, WritePrecision.S)
-                    )
-                    points.append(point)
-
-            # Sleep Analysis - separate measurements for each sleep type
-            for field, suffix in SLEEP_FIELDS.items():
-                if field in entry:
-                    sleep_entity_id = f"applehealth_sleep_analysis_{suffix}"
-                    sleep_measurement = f"hae.{sleep_entity_id}"
-                    point = (
-                        Point(sleep_measurement)
-                        .tag("domain", "hae")
-                        .tag("entity_id", sleep_entity_id)
-                        .field("value", float(entry[field]))
-                        .field("unit_of_measurement_str", "min")
-                        .time(timestamp, WritePrecision.S)
-                    )
-                    points.append(point)
-
-    return points
-
-
-def process_workouts(workouts: list[dict[str, Any]]) -> list[Point]:
-    """Process workout data into InfluxDB points.
+        is_kcal = units == "kcal"
+        final_unit = "kJ" if is_kcal else get_unit_string(units)
+        data = metric.get("data", [])
+        if not data:
+            continue
+
+        # A specialized processor is only safe if it handles every value field present
+        processor, handled = _PROCESSORS.get(entity_id, _QTY_PROCESSOR)
+        present = _VALUE_FIELDS.intersection(itertools.chain.from_iterable(data))
+        if not present <= handled:
+            processor = _process_mixed_entries
+        processor(lines, data, entity_id, final_unit, is_kcal)
+
+    return lines
+
+
+def process_workouts(workouts: list[dict[str, Any]]) -> list[str]:
+    """Process workout data into InfluxDB line protocol.
 
     Args:
         workouts: List of workout dictionaries from Health Auto Export.
 
     Returns:
-        List of InfluxDB Point objects.
+        List of line protocol strings.
     """
-    points: list[Point] = []
+    lines: list[str] = []
 
     for workout in workouts:
+        start = workout.get("start")
+        if not start:
+            continue
         workout_name = sanitize_metric_name(workout.get("name", "unknown"))
-        timestamp = parse_date(workout.get("start", ""))
+        ts = to_epoch_seconds(parse_date(start))
 
         # Workout Duration
         if "duration" in workout:
-            entity_id = f"applehealth_workout_{workout_name}_duration"
-            point = (
-                Point(f"hae.{entity_id}")
-                .tag("domain", "hae")
-                .tag("entity_id", entity_id)
-                .field("value", float(workout["duration"]) / 60.0)
-                .field("unit_of_measurement_str", "min")
-                .time(timestamp, WritePrecision.S)
-            )
-            points.append(point)
+            value = float(workout["duration"]) / 60.0
+            if math.isfinite(value):
+                series = series_key(f"applehealth_workout_{workout_name}_duration", "min")
+                lines.append(f"{series} value={format_float(value)} {ts}")
 
         # Active Energy
         if "activeEnergyBurned" in workout:
             energy = workout["activeEnergyBurned"]
             qty = float(energy.get("qty", 0)) if isinstance(energy, dict) else float(energy)
-            entity_id = f"applehealth_workout_{workout_name}_energy"
-            point = (
-                Point(f"hae.{entity_id}")
-                .tag("domain", "hae")
-                .tag("entity_id", entity_id)
-                .field("value", qty * 4.184)
-                .field("unit_of_measurement_str", "kJ")
-                .time(timestamp, WritePrecision.S)
-            )
-            points.append(point)
+            value = qty * 4.184
+            if math.isfinite(value):
+                series = series_key(f"applehealth_workout_{workout_name}_energy", "kJ")
+                lines.append(f"{series} value={format_float(value)} {ts}")
 
         # Distance
         if "distance" in workout:
             dist = workout["distance"]
             qty = float(dist.get("qty", 0)) if isinstance(dist, dict) else float(dist)
-            entity_id = f"applehealth_workout_{workout_name}_distance"
-            point = (
-                Point(f"hae.{entity_id}")
-                .tag("domain", "hae")
-                .tag("entity_id", entity_id)
-                .field("value", qty)
-                .field("unit_of_measurement_str", "km")
-                .time(timestamp, WritePrecision.S)
-            )
-            points.append(point)
+            if math.isfinite(qty):
+                series = series_key(f"applehealth_workout_{workout_name}_distance", "km")
+                lines.append(f"{series} value={format_float(qty)} {ts}")
 
-    return points
+    return lines
 
 
-def write_to_influxdb(
+def chain_batched(size: int, *iterables: Iterable[str]) -> Iterator[list[str]]:
+    """Split several iterables into consecutive batches without concatenating them.
+
+    Args:
+        size: Maximum number of items per batch.
+        *iterables: Iterables to batch, consumed in order.
+
+    Yields:
+        Lists of at most size items.
+    """
+    items = itertools.chain(*iterables)
+    while batch := list(itertools.islice(items, size)):
+        yield batch
+
+
+async def write_to_influxdb(
     write_api: WriteApi,
-    points: list[Point],
-    bucket: str | None = None,
-    org: str | None = None,
+    *line_groups: list[str],
+    bucket: str = INFLUXDB_BUCKET,
+    org: str = INFLUXDB_ORG,
 ) -> None:
-    """Write points to InfluxDB with error handling.
+    """Write line protocol to InfluxDB in batches of BATCH_SIZE with error handling.
+
+    Up to MAX_CONCURRENT_WRITES batches are written concurrently from worker
+    threads so that network round-trips overlap. Workers pull batches lazily,
+    so only the batches currently being written exist as separate lists.
+    Since batches overlap, the order in which they land is not defined.
+
+    If a batch fails, no further batches are started and its error is raised.
+    Batches already in flight may still complete, so a failed call can leave
+    a partial write; re-sending the same data is safe because points with the
+    same series and timestamp are overwritten.
 
     Args:
         write_api: InfluxDB write API instance.
-        points: List of Point objects to write.
+        *line_groups: Lists of line protocol strings with second precision
+            timestamps, written in order as if concatenated.
         bucket: Target bucket (defaults to config).
         org: Target org (defaults to config).
 
     Raises:
         Exception: If write fails after retries.
     """
-    if not points:
+    total = sum(len(lines) for lines in line_groups)
+    if not total:
         logger.debug("No points to write")
         return
 
-    bucket = bucket or Config.INFLUXDB_BUCKET
-    org = org or Config.INFLUXDB_ORG
+    batches = chain_batched(BATCH_SIZE, *line_groups)
+
+    async def write_batches() -> None:
+        # The generator is shared; next() never runs concurrently on the event loop
+        for batch in batches:
+            await asyncio.to_thread(
+                write_api.write,
+                bucket=bucket,
+                org=org,
+                record=batch,
+                write_precision=WritePrecision.S,
+            )
 
     try:
-        write_api.write(bucket=bucket, org=org, record=points)
-        logger.debug(f"Successfully wrote {len(points)} points to InfluxDB")
-    except Exception as e:
+        async with asyncio.TaskGroup() as group:
+            for _ in range(MAX_CONCURRENT_WRITES):
+                group.create_task(write_batches())
+        logger.debug(f"Successfully wrote {total} points to InfluxDB")
+    except ExceptionGroup as eg:
+        e = eg.exceptions[0]
         logger.error(f"Failed to write to InfluxDB: {e}")
-        raise
+        raise e from None
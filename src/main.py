@@ -4,23 +4,32 @@ Receives JSON data from Health Auto Export iOS app
 and writes it to InfluxDB.
 """
 
+import asyncio
+import hmac
+import itertools
 import logging
-import uuid
 from contextlib import asynccontextmanager
 from typing import Optional
 
-from fastapi import FastAPI, Request, Header, HTTPException
-from fastapi.responses import JSONResponse
+import orjson
+from fastapi import Depends, FastAPI, Request, Header, HTTPException
+from fastapi.responses import ORJSONResponse
 from influxdb_client import InfluxDBClient
 from influxdb_client.client.write_api import SYNCHRONOUS
 
-from .config import Config, setup_logging
+from .config import API_KEY, Config, setup_logging
 from .ingester import process_metrics, process_workouts, write_to_influxdb
 
 # Setup logging before anything else
 setup_logging()
 logger = logging.getLogger(__name__)
 
+# Encoded once for constant-time comparison on every request
+_API_KEY_BYTES = API_KEY.encode()
+
+# Monotonic request IDs for log correlation
+_req_counter = itertools.count()
+
 # Global InfluxDB client and write API
 influx_client: Optional[InfluxDBClient] = None
 write_api = None
@@ -45,6 +54,7 @@ async def lifespan(app: FastAPI):
             url=Config.INFLUXDB_URL,
             token=Config.INFLUXDB_TOKEN,
             org=Config.INFLUXDB_ORG,
+            enable_gzip=True,
         )
         # Test connection
         health = influx_client.health()
@@ -72,6 +82,7 @@ app = FastAPI(
     version="2.0.0",
     description="Ingests health data from Health Auto Export iOS app into InfluxDB",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 
@@ -89,50 +100,51 @@ async def root():
 async def health_check():
     """Health check endpoint for container orchestration."""
     if not influx_client or not write_api:
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=503,
             content={"status": "unhealthy", "reason": "InfluxDB not connected"},
         )
     return {"status": "healthy"}
 
 
-@app.post("/")
-@app.post("/api/healthdata")
-@app.post("/ingest")
-async def ingest_health_data(
-    request: Request,
-    authorization: Optional[str] = Header(None),
-):
+async def verify_api_key(authorization: Optional[str] = Header(None)) -> None:
+    """Reject requests without a valid API key (if one is configured)."""
+    if not API_KEY:
+        return
+
+    if not authorization:
+        logger.warning("Request rejected: missing authorization header")
+        raise HTTPException(
+            status_code=401,
+            detail={
+                "status": "error",
+                "error_code": "MISSING_AUTHORIZATION",
+                "message": "Authorization header required",
+            },
+        )
+    token = authorization.removeprefix("Bearer ").strip()
+    if not hmac.compare_digest(token.encode(), _API_KEY_BYTES):
+        logger.warning("Request rejected: invalid API key")
+        raise HTTPException(
+            status_code=403,
+            detail={
+                "status": "error",
+                "error_code": "INVALID_API_KEY",
+                "message": "Invalid API key",
+            },
+        )
+
+
+@app.post("/", dependencies=[Depends(verify_api_key)])
+@app.post("/api/healthdata", dependencies=[Depends(verify_api_key)])
+@app.post("/ingest", dependencies=[Depends(verify_api_key)])
+async def ingest_health_data(request: Request):
     """Receive health data and write to InfluxDB.
 
     Accepts JSON payload from Health Auto Export iOS app and writes
     metrics and workouts to InfluxDB.
     """
-    request_id = str(uuid.uuid4())[:8]
-
-    # API Key authentication (if configured)
-    if Config.API_KEY:
-        if not authorization:
-            logger.warning(f"[{request_id}] Request rejected: missing authorization header")
-            raise HTTPException(
-                status_code=401,
-                detail={
-                    "status": "error",
-                    "error_code": "MISSING_AUTHORIZATION",
-                    "message": "Authorization header required",
-                },
-            )
-        token = authorization.replace("Bearer ", "").strip()
-        if token != Config.API_KEY:
-            logger.warning(f"[{request_id}] Request rejected: invalid API key")
-            raise HTTPException(
-                status_code=403,
-                detail={
-                    "status": "error",
-                    "error_code": "INVALID_API_KEY",
-                    "message": "Invalid API key",
-                },
-            )
+    request_id = format(next(_req_counter), "08x")
 
     # Check InfluxDB connection
     if not write_api:
@@ -146,9 +158,14 @@ async def ingest_health_data(
             },
         )
 
-    # Parse JSON payload
+    # Parse JSON payload; the body is read from the stream so Starlette does
+    # not keep a cached copy of the raw bytes alive for the whole request.
+    # The payload is still buffered and parsed whole, so peak memory grows
+    # with the request size.
     try:
-        payload = await request.json()
+        body = b"".join([chunk async for chunk in request.stream()])
+        payload = orjson.loads(body)
+        del body
     except Exception as e:
         logger.error(f"[{request_id}] Failed to parse JSON: {e}")
         raise HTTPException(
@@ -168,18 +185,24 @@ async def ingest_health_data(
 
     logger.debug(f"[{request_id}] Processing {len(metrics)} metrics, {len(workouts)} workouts")
 
-    # Process metrics and workouts
-    metric_points = process_metrics(metrics)
-    workout_points = process_workouts(workouts)
-    all_points = metric_points + workout_points
+    # Process metrics and workouts off the event loop
+    metric_points, workout_points = await asyncio.gather(
+        asyncio.to_thread(process_metrics, metrics),
+        asyncio.to_thread(process_workouts, workouts),
+    )
+    total_points = len(metric_points) + len(workout_points)
+    workouts_imported = len(workouts)
+
+    # Release the parsed payload before the (slow) network writes
+    del payload, data, metrics, workouts
 
     # Write to InfluxDB
-    if all_points:
+    if total_points:
         try:
-            write_to_influxdb(write_api, all_points)
+            await write_to_influxdb(write_api, metric_points, workout_points)
             logger.info(
                 f"[{request_id}] Written: {len(metric_points)} metrics, "
-                f"{len(workout_points)} workouts, {len(all_points)} points total"
+                f"{len(workout_points)} workouts, {total_points} points total"
             )
         except Exception as e:
             logger.error(f"[{request_id}] InfluxDB write failed: {e}")
@@ -195,14 +218,14 @@ async def ingest_health_data(
     else:
         logger.info(f"[{request_id}] No data points to write")
 
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=200,
         content={
             "status": "success",
             "request_id": request_id,
             "metrics_imported": len(metric_points),
-            "workouts_imported": len(workouts),
-            "points_written": len(all_points),
+            "workouts_imported": workouts_imported,
+            "points_written": total_points,
         },
     )
 
@@ -0,0 +1,284 @@
+"""Tests for date parsing and line protocol generation in src.ingester.
+
+The ingester builds line protocol by hand instead of using influxdb-client's
+Point, so its output is checked against Point.to_line_protocol(). Dates are
+checked against dateutil, which parse_date only uses as a fallback.
+"""
+
+import asyncio
+import itertools
+import threading
+import time
+from datetime import datetime, timezone
+
+import pytest
+from dateutil import parser as date_parser
+from influxdb_client import Point, WritePrecision
+
+from src import ingester
+from src.ingester import (
+    format_float,
+    parse_date,
+    process_metrics,
+    process_workouts,
+    series_key,
+)
+
+TIMESTAMP = datetime(2024, 1, 1, 7, 0, tzinfo=timezone.utc)
+EPOCH_SECONDS = 1704092400
+
+
+def point_line(entity_id: str, unit: str, value: float) -> str:
+    """Build the reference line for a sample with influxdb-client's Point."""
+    point = Point(f"hae.{entity_id}").tag("domain", "hae").tag("entity_id", entity_id)
+    if unit:
+        point = point.tag("unit", unit)
+    return point.field("value", value).time(TIMESTAMP, WritePrecision.S).to_line_protocol()
+
+
+@pytest.mark.parametrize(
+    "date_str",
+    [
+        "2024-01-01 08:00:00 +0100",  # %Y-%m-%d %H:%M:%S %z
+        "2024-01-01T08:00:00+0100",  # %Y-%m-%dT%H:%M:%S%z
+        "2024-01-01T08:00:00.250+0100",  # %Y-%m-%dT%H:%M:%S.%f%z
+        "2024-01-01 08:00:00",  # %Y-%m-%d %H:%M:%S
+        "2024-01-01",  # %Y-%m-%d
+        "2024-01-01T08:00:00Z",
+        "2024-01-01T08:00:00+01:00",
+        "2024-01-01 08:00:00 -0530",
+        "2024-01-01T08:00:00.123456Z",
+        "Jan 3 2024 5:30pm",  # dateutil only
+    ],
+)
+def test_parse_date_matches_dateutil_in_utc(date_str):
+    expected = date_parser.parse(date_str)
+    if expected.tzinfo is None:
+        expected = expected.replace(tzinfo=timezone.utc)
+    expected = expected.astimezone(timezone.utc)
+
+    parsed = parse_date(date_str)
+
+    assert parsed == expected
+    assert parsed.utcoffset() == expected.utcoffset()
+    assert parsed.tzinfo is timezone.utc
+
+
+def test_parse_date_falls_back_to_now_without_caching():
+    ingester._parse_date_cached.cache_clear()
+    before = datetime.now(timezone.utc)
+
+    parsed = parse_date("not a date")
+
+    assert parsed.tzinfo is not None
+    assert before <= parsed <= datetime.now(timezone.utc)
+    assert ingester._parse_date_cached.cache_info().currsize == 0
+    assert parse_date("not a date") >= parsed
+
+
+@pytest.mark.parametrize(
+    ("entity_id", "unit"),
+    [
+        ("applehealth_step_count", "steps"),
+        ("applehealth_step_count", ""),
+        ("applehealth_a b,c=d", "count/min"),
+        ("applehealth_trailing\\", "m s"),
+        ("applehealth_tab\tnew\nline", "a,b=c\\"),
+    ],
+)
+def test_series_key_matches_point(entity_id, unit):
+    line = f"{series_key(entity_id, unit)} value=1 {EPOCH_SECONDS}"
+    assert line == point_line(entity_id, unit, 1.0)
+
+
+@pytest.mark.parametrize(
+    "value",
+    [0.0, -0.0, 1.0, 3.5, 43.932, 1e-05, 1.5e-07, 1e16, 1e300, -2.5e-300, 123456789.125],
+)
+def test_format_float_matches_point(value):
+    line = f"{series_key('applehealth_x', 'ms')} value={format_float(value)} {EPOCH_SECONDS}"
+    assert line == point_line("applehealth_x", "ms", value)
+
+
+def test_process_metrics_matches_point_for_escaped_names():
+    metrics = [{
+        "name": "Odd, Metric=1",
+        "units": "m s",
+        "data": [{"date": "2024-01-01 08:00:00 +0100", "qty": 2.5e-7}],
+    }]
+    assert process_metrics(metrics) == [point_line("applehealth_odd,_metric=1", "m s", 2.5e-7)]
+
+
+@pytest.mark.parametrize("bad", ["NaN", "inf", "-inf"])
+def test_process_metrics_skips_non_finite_values(bad):
+    assert point_line("applehealth_step_count", "steps", float(bad)) == ""
+
+    date = "2024-01-01 08:00:00 +0100"
+    metrics = [
+        {"name": "step_count", "units": "count", "data": [{"date": date, "qty": bad}, {"date": date, "qty": 3}]},
+        {"name": "heart_rate", "units": "count/min", "data": [{"date": date, "Min": bad, "Avg": 60}]},
+        {"name": "sleep_analysis", "units": "hr", "data": [{"date": date, "deep": bad, "rem": 1.5}]},
+    ]
+    assert process_metrics(metrics) == [
+        point_line("applehealth_step_count", "steps", 3.0),
+        point_line("applehealth_heart_rate_avg", "bpm", 60.0),
+        point_line("applehealth_sleep_analysis_rem", "min", 1.5),
+    ]
+
+
+def test_process_workouts_skips_non_finite_values():
+    workouts = [{
+        "name": "Outdoor Run",
+        "start": "2024-01-01 08:00:00 +0100",
+        "duration": "NaN",
+        "activeEnergyBurned": {"qty": "inf"},
+        "distance": {"qty": 5.2},
+    }]
+    assert process_workouts(workouts) == [
+        point_line("applehealth_workout_outdoor_run_distance", "km", 5.2),
+    ]
+
+
+def test_process_metrics_keeps_composite_fields_after_qty_entries():
+    date = "2024-01-01 08:00:00 +0100"
+    metrics = [{
+        "name": "custom_metric",
+        "units": "count/min",
+        "data": [{"date": date, "qty": 1}, {"date": date, "qty": 2, "Min": 1, "deep": 0.5}],
+    }]
+    assert process_metrics(metrics) == [
+        point_line("applehealth_custom_metric", "bpm", 1.0),
+        point_line("applehealth_custom_metric", "bpm", 2.0),
+        point_line("applehealth_custom_metric_min", "bpm", 1.0),
+        point_line("applehealth_sleep_analysis_deep", "min", 0.5),
+    ]
+
+
+def test_process_metrics_keeps_qty_of_heart_rate_and_sleep_samples():
+    date = "2024-01-01 08:00:00 +0100"
+    metrics = [
+        {"name": "heart_rate", "units": "count/min", "data": [{"date": date, "qty": 65}]},
+        {"name": "sleep_analysis", "units": "hr", "data": [{"date": date, "qty": 1.5, "value": "Core"}]},
+    ]
+    assert process_metrics(metrics) == [
+        point_line("applehealth_heart_rate", "bpm", 65.0),
+        point_line("applehealth_sleep_analysis", "hr", 1.5),
+    ]
+
+
+
+@pytest.mark.parametrize(
+    ("name", "units", "fields", "entity_id", "unit"),
+    [
+        ("step_count", "count", {"qty": 3}, "applehealth_step_count", "steps"),
+        ("heart_rate", "count/min", {"Avg": 3}, "applehealth_heart_rate_avg", "bpm"),
+        ("sleep_analysis", "hr", {"rem": 3}, "applehealth_sleep_analysis_rem", "min"),
+        ("custom_metric", "ms", {"qty": 3, "Avg": 3}, "applehealth_custom_metric", "ms"),
+    ],
+)
+def test_process_metrics_skips_entries_without_date(name, units, fields, entity_id, unit):
+    metrics = [{
+        "name": name,
+        "units": units,
+        "data": [
+            fields,
+            {"date": "", **fields},
+            {"date": "2024-01-01 08:00:00 +0100", **fields},
+        ],
+    }]
+    lines = process_metrics(metrics)
+    assert point_line(entity_id, unit, 3.0) in lines
+    assert all(line.endswith(f" {EPOCH_SECONDS}") for line in lines)
+    assert len(lines) == len(fields)
+
+
+def test_process_workouts_skips_workouts_without_start():
+    workouts = [
+        {"name": "Outdoor Run", "distance": 1.0},
+        {"name": "Outdoor Run", "start": "", "distance": 2.0},
+        {"name": "Outdoor Run", "start": "2024-01-01 08:00:00 +0100", "distance": 5.2},
+    ]
+    assert process_workouts(workouts) == [
+        point_line("applehealth_workout_outdoor_run_distance", "km", 5.2),
+    ]
+
+
+class FakeWriteApi:
+    """Records batches passed to write() and tracks how many run at once."""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.batches: list[list[str]] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def write(self, bucket, org, record, write_precision=None):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            self.batches.append(list(record))
+        try:
+            time.sleep(0.01)
+            if self.fail:
+                raise RuntimeError("write failed")
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def test_write_to_influxdb_bounds_in_flight_writes(monkeypatch):
+    monkeypatch.setattr(ingester, "BATCH_SIZE", 2)
+    write_api = FakeWriteApi()
+    metric_lines = [f"m{i}" for i in range(15)]
+    workout_lines = [f"w{i}" for i in range(6)]
+
+    asyncio.run(ingester.write_to_influxdb(write_api, metric_lines, workout_lines))
+
+    assert 1 < write_api.max_in_flight <= ingester.MAX_CONCURRENT_WRITES
+    assert all(len(batch) <= 2 for batch in write_api.batches)
+    assert sorted(line for batch in write_api.batches for line in batch) == sorted(
+        metric_lines + workout_lines
+    )
+
+
+def test_write_to_influxdb_stops_after_failed_batch(monkeypatch):
+    monkeypatch.setattr(ingester, "BATCH_SIZE", 1)
+    write_api = FakeWriteApi(fail=True)
+
+    with pytest.raises(RuntimeError, match="write failed"):
+        asyncio.run(ingester.write_to_influxdb(write_api, [f"m{i}" for i in range(50)]))
+
+    assert len(write_api.batches) <= ingester.MAX_CONCURRENT_WRITES
+
+
+def test_chain_batched_is_lazy():
+    batches = ingester.chain_batched(2, ["a", "b", "c"], itertools.count())
+    assert next(batches) == ["a", "b"]
+    assert next(batches) == ["c", 0]
+
+
+def test_write_to_influxdb_builds_batches_lazily(monkeypatch):
+    monkeypatch.setattr(ingester, "BATCH_SIZE", 1)
+    built = 0
+    outstanding: list[int] = []
+    chain_batched = ingester.chain_batched
+
+    def counting_chain_batched(size, *iterables):
+        nonlocal built
+        for batch in chain_batched(size, *iterables):
+            built += 1
+            yield batch
+
+    class RecordingWriteApi(FakeWriteApi):
+        def write(self, *args, **kwargs):
+            with self._lock:
+                completed = len(self.batches) - self.in_flight
+            outstanding.append(built - completed)
+            super().write(*args, **kwargs)
+
+    monkeypatch.setattr(ingester, "chain_batched", counting_chain_batched)
+    asyncio.run(ingester.write_to_influxdb(RecordingWriteApi(), [f"m{i}" for i in range(30)]))
+
+    assert built == 30
+    assert max(outstanding) <= ingester.MAX_CONCURRENT_WRITES
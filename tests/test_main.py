@@ -0,0 +1,55 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from src import main
+
+PAYLOAD = {"data": {"metrics": [], "workouts": []}}
+
+
+class FakeWriteApi:
+    def write(self, bucket, org, record, write_precision=None):
+        pass
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main, "API_KEY", "secret")
+    monkeypatch.setattr(main, "_API_KEY_BYTES", b"secret")
+    monkeypatch.setattr(main, "write_api", FakeWriteApi())
+    monkeypatch.setattr(main, "influx_client", object())
+    # Not used as a context manager, so the lifespan never connects to InfluxDB
+    return TestClient(main.app)
+
+
+def test_missing_authorization_is_rejected(client):
+    response = client.post("/api/healthdata", json=PAYLOAD)
+    assert response.status_code == 401
+    assert response.json()["detail"]["error_code"] == "MISSING_AUTHORIZATION"
+
+
+def test_wrong_api_key_is_rejected(client):
+    response = client.post("/api/healthdata", json=PAYLOAD, headers={"Authorization": "Bearer nope"})
+    assert response.status_code == 403
+    assert response.json()["detail"]["error_code"] == "INVALID_API_KEY"
+
+
+@pytest.mark.parametrize("authorization", ["Bearer secret", "secret"])
+@pytest.mark.parametrize("path", ["/", "/api/healthdata", "/ingest"])
+def test_valid_api_key_is_accepted(client, path, authorization):
+    response = client.post(path, json=PAYLOAD, headers={"Authorization": authorization})
+    assert response.status_code == 200
+    assert response.json()["status"] == "success"
+
+
+def test_non_ascii_authorization_is_rejected(client):
+    response = client.post(
+        "/api/healthdata", json=PAYLOAD, headers={"Authorization": "Bearer ключ".encode()}
+    )
+    assert response.status_code == 403
+
+
+def test_no_api_key_configured_allows_requests(client, monkeypatch):
+    monkeypatch.setattr(main, "API_KEY", "")
+    monkeypatch.setattr(main, "_API_KEY_BYTES", b"")
+    response = client.post("/api/healthdata", json=PAYLOAD)
+    assert response.status_code == 200